@@ -682,17 +682,38 @@ function updateSearchRadius() {
     }
 }
 
-// Calculate distance between two points in miles
-function calculateDistance(lat1, lon1, lat2, lon2) {
+// Build a function giving the distance in miles from a fixed origin. The
+// origin's terms are computed once instead of for every station.
+function distanceFrom(lat1, lon1) {
     const R = 3959; // Earth's radius in miles
-    const dLat = (lat2 - lat1) * Math.PI / 180;
-    const dLon = (lon2 - lon1) * Math.PI / 180;
-    const a =
-        Math.sin(dLat/2) * Math.sin(dLat/2) +
-        Math.cos(lat1 * Math.PI / 180) * Math.cos(lat2 * Math.PI / 180) *
-        Math.sin(dLon/2) * Math.sin(dLon/2);
-    const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1-a));
-    return R * c;
+    const toRad = Math.PI / 180;
+    const cosLat1 = Math.cos(lat1 * toRad);
+
+    return (lat2, lon2) => {
+        const sinDLat = Math.sin((lat2 - lat1) * toRad / 2);
+        const sinDLon = Math.sin((lon2 - lon1) * toRad / 2);
+        const a =
+            sinDLat * sinDLat +
+            cosLat1 * Math.cos(lat2 * toRad) * sinDLon * sinDLon;
+        const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1-a));
+        return R * c;
+    };
+}
+
+// Return the k smallest items under compare, in order, without sorting the
+// whole list (each item is insertion-placed into a bounded, sorted buffer)
+function smallestK(items, k, compare) {
+    const best = [];
+    for (const item of items) {
+        if (best.length === k && compare(item, best[k - 1]) >= 0) continue;
+        let j = Math.min(best.length, k - 1);
+        while (j > 0 && compare(item, best[j - 1]) < 0) {
+            best[j] = best[j - 1];
+            j--;
+        }
+        best[j] = item;
+    }
+    return best;
 }
 
 // Update cheapest stations list based on user location
@@ -701,6 +722,7 @@ function updateCheapestStations() {
 
     const stationsList = document.getElementById('stations-list');
     const results = allData.results.filter(r => r.status === 'success');
+    const distanceTo = distanceFrom(userLocation.lat, userLocation.lng);
 
     // Collect all stations with prices and distances
     const stationsWithPrices = [];
@@ -717,10 +739,7 @@ function updateCheapestStations() {
 
             if (isNaN(lat) || isNaN(lon)) return;
 
-            const distance = calculateDistance(
-                userLocation.lat, userLocation.lng,
-                lat, lon
-            );
+            const distance = distanceTo(lat, lon);
 
             stationsWithPrices.push({
                 name: getStationName(station),
@@ -757,18 +776,17 @@ function updateCheapestStations() {
     }
 
     fuelTypesToShow.forEach(fuelType => {
-        // Get stations with this fuel type, filter by distance, sorted by price then distance
-        const stationsWithFuel = stationsWithPrices
+        // Get stations with this fuel type, filter by distance, top 5 by price then distance
+        const candidates = stationsWithPrices
             .filter(s => s.prices[fuelType] && s.distance <= maxDistance)
             .map(s => ({
                 ...s,
                 price: s.prices[fuelType]
-            }))
-            .sort((a, b) => {
-                if (a.price !== b.price) return a.price - b.price;
-                return a.distance - b.distance;
-            })
-            .slice(0, 5);
+            }));
+        const stationsWithFuel = smallestK(candidates, 5, (a, b) => {
+            if (a.price !== b.price) return a.price - b.price;
+            return a.distance - b.distance;
+        });
 
         if (stationsWithFuel.length === 0) return;
 
@@ -8,57 +8,215 @@
  * Learn more at https://developers.cloudflare.com/workers/
  */
 
-const getLatestDataFromR2 = async (env) => {
+// Parsed copy of the R2 object, kept for the lifetime of the isolate and
+// keyed on the object's etag so a new upload is picked up on the next request.
+let cachedData = null;
+let pendingLoad = null;
+
+const loadDataFromR2 = async (env) => {
   const bucket = env["fuel-prices"];
   const objectKey = "fuel_prices.json";
 
-  const object = await bucket.get(objectKey);
+  // Conditional get: R2 returns the object without a body when the etag
+  // still matches, so an unchanged file is never downloaded or re-parsed.
+  const object = await bucket.get(
+    objectKey,
+    cachedData ? { onlyIf: { etagDoesNotMatch: cachedData.etag } } : undefined
+  );
   if (!object) {
     throw new Error("Object not found in R2 bucket");
   }
 
-  const data = await object.text();
-  return JSON.parse(data);
+  if (!("body" in object) && cachedData && object.etag === cachedData.etag) {
+    return cachedData;
+  }
+
+  // Parse straight from the body stream rather than materialising the
+  // whole file as an intermediate string first.
+  const data = await object.json();
+  cachedData = { etag: object.etag, data };
+  return cachedData;
 }
 
-function haversine(lat1, lon1, lat2, lon2) {
-  const R = 6371; // Radius of the Earth in kilometers
-  const dLat = (lat2 - lat1) * (Math.PI / 180);
-  const dLon = (lon2 - lon1) * (Math.PI / 180);
-  const a =
-    Math.sin(dLat / 2) * Math.sin(dLat / 2) +
-    Math.cos(lat1 * (Math.PI / 180)) *
-      Math.cos(lat2 * (Math.PI / 180)) *
-      Math.sin(dLon / 2) *
-      Math.sin(dLon / 2);
-  const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
-  const distance = R * c; // Distance in kilometers
-  return distance;
+const getCachedData = async (env) => {
+  // Share one in-flight load between concurrent requests in this isolate.
+  if (!pendingLoad) {
+    pendingLoad = loadDataFromR2(env).finally(() => {
+      pendingLoad = null;
+    });
+  }
+
+  return pendingLoad;
 }
 
-function normalise(retailer, station) {
-  switch (retailer) {
-    case "Costco":
-      return {
-        name: station.name,
-        address: `${station.address.line1}, ${station.address.town}, ${station.address.postalCode}`,
-        latitude: station.geoPoint.latitude,
-        longitude: station.geoPoint.longitude,
-        prices: {
-          unleaded: station.fuelPrices.REGULAR.price,
-          diesel: station.fuelPrices.DIESEL.price,
-          premium_unleaded: station.fuelPrices.PREMIUM.price,
-        },
-      };
-    default:
-      return {
-        name: station.name ?? station.displayName,
-        address: station.address?.line1 ?? station.address,
-        latitude: station.latitude ?? station.location?.latitude ?? station.geo?.latitude,
-        longitude: station.longitude ?? station.location?.longitude ?? station.geo?.longitude,
-        prices: station.prices ?? station.fuelPrices,
-      };
+const getLatestBodyFromR2 = async (env) => {
+  const cached = await getCachedData(env);
+  // Serialised once per data version rather than on every request.
+  cached.body ??= JSON.stringify(cached.data);
+  return cached.body;
+}
+
+const getStationIndex = async (env) => {
+  const cached = await getCachedData(env);
+  // Built on first use so /latest-fuel-prices never pays for it.
+  cached.index ??= buildStationIndex(cached.data);
+  return cached.index;
+}
+
+const EARTH_RADIUS_KM = 6371; // Radius of the Earth in kilometers
+const DEG_TO_RAD = Math.PI / 180;
+const SMALL_LIMIT = 32; // Largest ?limit= served by smallestK() rather than a sort
+
+// Flatten every located station into parallel typed arrays once per data
+// version, so a nearby search is a tight numeric scan rather than a walk
+// over the nested retailer payloads.
+function buildStationIndex(data) {
+  const stations = [];
+  const lats = [];
+  const lons = [];
+
+  for (const retailer of data.results) {
+    if (retailer.status === "success" && retailer.data) {
+      const retailerStations = retailer.data.stations ?? retailer.data.stores;
+      if (retailerStations) {
+        for (const station of retailerStations) {
+          const s = normalise(station);
+          const lat = Number(s.latitude);
+          const lon = Number(s.longitude);
+
+          // Missing, 0/0 placeholder, unparseable or out-of-range coordinates
+          // are dropped here once, so the distance scan never sees them.
+          if (lat && lon && Math.abs(lat) <= 90 && Math.abs(lon) <= 180) {
+            stations.push({
+              retailer: retailer.retailer,
+              name: s.name,
+              address: s.address,
+              prices: canonicalPrices(s.prices),
+              last_updated: station.last_updated ?? retailer.data.last_updated,
+            });
+            lats.push(lat * DEG_TO_RAD);
+            lons.push(lon * DEG_TO_RAD);
+          }
+        }
+      }
+    }
+  }
+
+  const lat = Float64Array.from(lats);
+  return {
+    stations,
+    lat,
+    lon: Float64Array.from(lons),
+    cosLat: lat.map(Math.cos),
+    pricesByFuel: new Map(),
+  };
+}
+
+// Per-station prices for one fuel type as integer thousandths of a penny
+// (0 where a station doesn't sell it), extracted on first request for that
+// fuel and memoised on the index. Integers halve the array size against
+// float64 and compare exactly. Returns null if no station lists the fuel, so
+// unknown names aren't cached.
+function fuelPrices(index, fuelType) {
+  let prices = index.pricesByFuel.get(fuelType);
+  if (prices === undefined) {
+    let found = false;
+    prices = new Int32Array(index.stations.length);
+    for (let i = 0; i < prices.length; i++) {
+      const s = index.stations[i];
+      const price = s.prices ? s.prices[fuelType] : undefined;
+      // NaN from an unparseable price is stored as 0, i.e. not sold.
+      prices[i] = price ? Math.round(Number(price) * 1000) : 0;
+      found ||= prices[i] > 0;
+    }
+    if (!found) {
+      return null;
+    }
+    index.pricesByFuel.set(fuelType, prices);
   }
+  return prices;
+}
+
+// Haversine distance (km) from one point to every indexed station.
+function distancesFrom(index, lat, long) {
+  const lat1 = Number(lat) * DEG_TO_RAD;
+  const lon1 = Number(long) * DEG_TO_RAD;
+  const cosLat1 = Math.cos(lat1);
+  const { lat: lats, lon: lons, cosLat } = index;
+  const distances = new Float64Array(lats.length);
+
+  for (let i = 0; i < lats.length; i++) {
+    const sinDLat = Math.sin((lats[i] - lat1) / 2);
+    const sinDLon = Math.sin((lons[i] - lon1) / 2);
+    const a = sinDLat * sinDLat + cosLat1 * cosLat[i] * sinDLon * sinDLon;
+    distances[i] = EARTH_RADIUS_KM * 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
+  }
+
+  return distances;
+}
+
+// The k smallest items under compare, in order, without sorting the whole
+// list: each item is insertion-placed into a bounded, sorted buffer.
+function smallestK(items, k, compare) {
+  const best = [];
+  for (const item of items) {
+    if (best.length === k && compare(item, best[k - 1]) >= 0) {
+      continue;
+    }
+    let j = Math.min(best.length, k - 1);
+    while (j > 0 && compare(item, best[j - 1]) < 0) {
+      best[j] = best[j - 1];
+      j--;
+    }
+    best[j] = item;
+  }
+  return best;
+}
+
+// Names clients and feeds use for each fuel, keyed by the grade code the
+// retailer feeds publish.
+const FUEL_SYNONYMS = {
+  E10: ["e10", "unleaded", "petrol", "regular"],
+  E5: ["e5", "super_unleaded", "premium_unleaded", "premium"],
+  B7: ["b7", "diesel"],
+  SDV: ["sdv", "premium_diesel", "super_diesel"],
+};
+
+// Inverted once at startup so resolving a name is a single Map lookup.
+const FUEL_INDEX = new Map(
+  Object.entries(FUEL_SYNONYMS).flatMap(([code, names]) => names.map((name) => [name, code]))
+);
+
+// Resolve a fuel name to its grade code; unknown names are only normalised.
+function canonicalFuel(name) {
+  const key = String(name).trim().toLowerCase().replace(/[\s-]+/g, "_");
+  return FUEL_INDEX.get(key) ?? key;
+}
+
+// Re-key a station's prices by grade code, once at index build.
+function canonicalPrices(prices) {
+  if (!prices || typeof prices !== "object") {
+    return prices;
+  }
+  const canonical = {};
+  for (const [name, price] of Object.entries(prices)) {
+    canonical[canonicalFuel(name)] ??= price;
+  }
+  return canonical;
+}
+
+// Map any retailer's station record onto the fields the API returns. The
+// checker already normalises Costco into the common stations format, so the
+// shape is detected from the record itself rather than the retailer name.
+function normalise(station) {
+  const location = station.location ?? station.geo ?? station.geoPoint;
+  return {
+    name: station.name ?? station.site_name ?? station.displayName,
+    address: station.address?.line1 ?? station.address,
+    latitude: station.latitude ?? location?.latitude,
+    longitude: station.longitude ?? location?.longitude,
+    prices: station.prices ?? station.fuelPrices,
+  };
 }
 
 export default {
@@ -86,8 +244,8 @@ export default {
     if (request.method === "GET") {
       if (pathname === "/latest-fuel-prices") {
         try {
-          const data = await getLatestDataFromR2(env);
-          return new Response(JSON.stringify(data), {
+          const body = await getLatestBodyFromR2(env);
+          return new Response(body, {
             status: 200,
             headers: {
               "content-type": "application/json",
@@ -149,47 +307,54 @@ export default {
           const lat = searchParams.get("lat");
           const long = searchParams.get("long");
 
-          const data = await getLatestDataFromR2(env);
+          const index = await getStationIndex(env);
 
           const radius = searchParams.get("radius") || 10; // Default radius in km
-          const fuelType = searchParams.get("fuel") || "unleaded"; // Default fuel type
-
-          let stationsNearby = [];
-
-          for (const retailer of data.results) {
-            if (retailer.status === "success" && retailer.data) {
-              const stations = retailer.data.stations ?? retailer.data.stores;
-              if (stations) {
-                for (const station of stations) {
-                  const s = normalise(retailer.retailer, station);
-
-                  if (s.latitude && s.longitude) {
-                    const distance = haversine(lat, long, s.latitude, s.longitude);
-                    if (distance <= radius) {
-                      const price = s.prices ? s.prices[fuelType] : undefined;
-
-                      if (price) {
-                        stationsNearby.push({
-                          retailer: retailer.retailer,
-                          name: s.name,
-                          address: s.address,
-                          distance: distance.toFixed(2),
-                          price: price,
-                          last_updated: station.last_updated ?? retailer.data.last_updated,
-                        });
-                      }
-                    }
-                  }
-                }
+          const fuelType = canonicalFuel(searchParams.get("fuel") || "unleaded"); // Default fuel type
+          const limit = Number.parseInt(searchParams.get("limit"), 10); // Optional cap on results
+
+          // Rank candidates by index and only build response objects for
+          // the rows that are actually returned.
+          const prices = fuelPrices(index, fuelType);
+          const candidates = [];
+          let distances;
+          if (prices) {
+            distances = distancesFrom(index, lat, long);
+            for (let i = 0; i < distances.length; i++) {
+              if (distances[i] <= radius && prices[i] > 0) {
+                candidates.push(i);
               }
             }
           }
 
-          stationsNearby.sort((a, b) => a.price - b.price);
+          // Cheapest first, nearest first among equal prices.
+          // A bounded selection beats a full sort only while the limit is small.
+          const byPriceThenDistance = (a, b) => prices[a] - prices[b] || distances[a] - distances[b];
+          let selected;
+          if (limit > 0 && limit <= SMALL_LIMIT) {
+            selected = smallestK(candidates, limit, byPriceThenDistance);
+          } else {
+            selected = candidates.sort(byPriceThenDistance);
+            if (limit > 0) {
+              selected = selected.slice(0, limit);
+            }
+          }
+
+          const stationsNearby = selected.map((i) => {
+            const s = index.stations[i];
+            return {
+              retailer: s.retailer,
+              name: s.name,
+              address: s.address,
+              distance: distances[i].toFixed(2),
+              price: s.prices[fuelType],
+              last_updated: s.last_updated,
+            };
+          });
 
           return new Response(
             JSON.stringify({
-              message: `Found ${stationsNearby.length} stations within ${radius}km.`,
+              message: `Found ${candidates.length} stations within ${radius}km.`,
               stations: stationsNearby,
             }),
             {
@@ -5,11 +5,84 @@ Fetches and displays current fuel prices from various UK fuel retailers.
 """
 
 import concurrent.futures
-import json
+import functools
+import operator
+import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Resolved next to this file so the checker works from any working directory
+RETAILERS_FILE = Path(__file__).with_name("retailers.json")
+
+
+@functools.cache
+def load_retailers(path: Path = RETAILERS_FILE) -> Tuple[Tuple[str, str], ...]:
+    """
+    Load the retailer list, parsing each file at most once per process.
+
+    Args:
+        path: JSON file mapping retailer name to prices URL
+
+    Returns:
+        Tuple of (retailer, url) pairs
+    """
+    return tuple(orjson.loads(Path(path).read_bytes()).items())
+
+
+def write_json_atomic(filename: str, obj: Any):
+    """
+    Write compact JSON to a temporary file and swap it into place, so readers
+    never see a partially written file.
+
+    Args:
+        filename: Output filename
+        obj: Object to serialise
+    """
+    tmp_filename = f"{filename}.tmp"
+    try:
+        with open(tmp_filename, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE))
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        # Don't leave a stale temporary file behind on failure
+        try:
+            os.remove(tmp_filename)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def stations_from_dict(data: Dict) -> Any:
+    """Return a dict payload's stations."""
+    # Most retailers use "stations" key (including normalized Costco); some
+    # might have different structures, so treat the dict as a single station
+    return data["stations"] if "stations" in data else [data]
+
+
+def stations_from_list(data: List) -> List:
+    """Return a list payload, which is already the stations."""
+    return data
+
+
+STATION_EXTRACTORS: Dict[type, Callable[[Any], Any]] = {
+    dict: stations_from_dict,
+    list: stations_from_list,
+}
+
+
+def count_stations(data: Any) -> int:
+    """Return the number of stations in a retailer payload."""
+    # Handle different JSON structures with one lookup on the exact type
+    # that orjson produced; anything else has no stations
+    extractor = STATION_EXTRACTORS.get(type(data))
+    stations = extractor(data) if extractor else []
+    return len(stations) if isinstance(stations, list) else 0
 
 
 class FuelPriceChecker:
@@ -22,22 +95,74 @@ class FuelPriceChecker:
         "5303": "Diesel",
     }
 
-    with open("retailers.json", "r") as f:
-        RETAILERS = json.load(f)
+    # Summary separators
+    RULE = "=" * 80
+    DIVIDER = "-" * 80
+
+    # Extra request headers for retailers that need them
+    RETAILER_HEADERS = {
+        # Shell URL ends in .html but returns JSON
+        "Shell": {"Accept": "application/json"},
+    }
 
-    def __init__(self, timeout: int = 10):
+    def __init__(
+        self,
+        timeout: int = 10,
+        etag_cache_file: str = "./.data/etag_cache.json",
+        max_workers: Optional[int] = None,
+    ):
         """
         Initialize the fuel price checker.
 
         Args:
             timeout: Request timeout in seconds
+            etag_cache_file: File holding each URL's validators and last data
+            max_workers: Maximum number of concurrent requests (default: one
+                per retailer, so a run takes as long as the slowest fetch)
         """
         self.timeout = timeout
+        self.retailers = load_retailers(
+            Path(os.environ.get("RETAILERS_PATH", RETAILERS_FILE))
+        )
+
+        # Worker threads are kept for the checker's lifetime and reused by
+        # every fetch_all_prices call; close() shuts them down
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or max(1, len(self.retailers)),
+            thread_name_prefix="fuel",
+        )
+        self.etag_cache_file = etag_cache_file
+        self.etag_cache = self.load_etag_cache()
         self.session = requests.Session()
         self.session.headers.update(
             {"User-Agent": ("Mozilla/5.0 (X11; Linux x86_64) " "AppleWebKit/537.36")}
         )
 
+        # Every retailer is a separate host; keep a pool per host so repeat
+        # fetches reuse kept-alive connections instead of evicting them.
+        # Transient server errors are retried with a short backoff; the last
+        # response is still returned so raise_for_status reports it as before.
+        # Only statuses are retried: connect and read failures surface at
+        # once as before, and Retry-After is ignored so a rate-limiting
+        # retailer can't stall the run
+        retry = Retry(
+            total=None,
+            connect=0,
+            read=False,
+            other=0,
+            status=2,
+            backoff_factor=0.2,
+            respect_retry_after_header=False,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=max(1, len(self.retailers)), max_retries=retry
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
     def fetch_prices(self, retailer: str, url: str) -> Dict:
         """
         Fetch fuel prices from a single retailer.
@@ -50,25 +175,69 @@ class FuelPriceChecker:
             Dictionary containing retailer info and prices or error
         """
         try:
-            # Shell URL ends in .html but returns JSON
-            headers = {}
-            if retailer == "Shell":
-                headers = {"Accept": "application/json"}
+            # Copied, as conditional request headers are added below
+            headers = dict(self.RETAILER_HEADERS.get(retailer, ()))
+
+            # Revalidate against the last response so unchanged feeds come
+            # back as an empty 304 instead of a full download
+            cached = self.etag_cache.get(url)
+            if cached:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
 
             response = self.session.get(url, timeout=self.timeout, headers=headers)
             response.raise_for_status()
 
-            data = response.json()
-
-            # Normalize Costco data to standard format
-            if retailer == "Costco":
-                data = self.normalize_costco_data(data)
-
+            if cached and response.status_code == 304:
+                data = cached["data"]
+            else:
+                # Rate-limit and error pages come back as HTML or text; spot
+                # them from the first byte instead of running the parser.
+                # orjson rejects a UTF-8 BOM, which response.json() tolerated,
+                # so it is dropped before either looks at the body
+                body = response.content.removeprefix(b"\xef\xbb\xbf")
+                head = body.lstrip()[:1]
+                if head == b"<":
+                    return {
+                        "retailer": retailer,
+                        "status": "html_format",
+                        "message": "Received HTML instead of JSON",
+                        "url": url,
+                    }
+                if head not in (b"{", b"["):
+                    return {
+                        "retailer": retailer,
+                        "status": "error",
+                        "error": "Invalid JSON response",
+                        "url": url,
+                    }
+
+                # Parse the raw bytes directly rather than via response.text
+                data = orjson.loads(body)
+
+                # Normalize Costco data to standard format
+                if retailer == "Costco":
+                    data = self.normalize_costco_data(data)
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if etag or last_modified:
+                    self.etag_cache[url] = {
+                        "etag": etag,
+                        "last_modified": last_modified,
+                        "data": data,
+                    }
+
+            # Stations are counted here on the worker thread so the summary
+            # doesn't have to walk every payload again afterwards
             return {
                 "retailer": retailer,
                 "status": "success",
                 "data": data,
                 "url": url,
+                "station_count": count_stations(data),
             }
 
         except requests.exceptions.Timeout:
@@ -85,7 +254,7 @@ class FuelPriceChecker:
                 "error": str(e),
                 "url": url,
             }
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return {
                 "retailer": retailer,
                 "status": "error",
@@ -166,119 +335,149 @@ class FuelPriceChecker:
 
         return {"stations": stations}
 
-    def fetch_all_prices(self, max_workers: int = 5) -> List[Dict]:
+    def iter_all_prices(self) -> Iterator[Dict]:
         """
-        Fetch prices from all retailers concurrently.
-
-        Args:
-            max_workers: Maximum number of concurrent requests
+        Fetch prices from all retailers concurrently, yielding each result as
+        soon as its fetch completes.
 
-        Returns:
-            List of dictionaries containing results from each retailer
+        Yields:
+            Result dictionary from fetch_prices for each retailer
         """
-        results = []
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_retailer = {
-                executor.submit(self.fetch_prices, retailer, url): retailer
-                for retailer, url in self.RETAILERS.items()
-            }
+        future_to_retailer = {
+            self.executor.submit(self.fetch_prices, retailer, url): retailer
+            for retailer, url in self.retailers
+        }
 
+        # Saved even if the caller stops consuming early, as the cache has
+        # already been updated by every fetch that completed
+        try:
             for future in concurrent.futures.as_completed(future_to_retailer):
-                results.append(future.result())
-
-        return results
+                yield future.result()
+        finally:
+            self.save_etag_cache()
 
-    def extract_station_info(self, result: Dict) -> Optional[Dict]:
+    def fetch_all_prices(self) -> List[Dict]:
         """
-        Extract basic station information from a result.
-
-        Args:
-            result: Result dictionary from fetch_prices
+        Fetch prices from all retailers concurrently.
 
         Returns:
-            Dictionary with extracted info or None
+            List of dictionaries containing results from each retailer
         """
-        if result["status"] != "success":
-            return None
+        return list(self.iter_all_prices())
 
-        data = result["data"]
-        retailer = result["retailer"]
+    def close(self):
+        """Shut down the worker threads and close pooled connections."""
+        self.executor.shutdown(wait=True)
+        self.session.close()
 
-        # Handle different JSON structures
-        stations = []
+    def __enter__(self) -> "FuelPriceChecker":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
-        # Most retailers use "stations" key (including normalized Costco)
-        if isinstance(data, dict) and "stations" in data:
-            stations = data["stations"]
-        elif isinstance(data, list):
-            stations = data
-        elif isinstance(data, dict):
-            # Some might have different structures
-            stations = [data]
+    def load_etag_cache(self) -> Dict:
+        """
+        Load the conditional request cache written by a previous run.
 
+        Returns:
+            Dictionary mapping URL to its ETag, Last-Modified and data
+        """
+        try:
+            with open(self.etag_cache_file, "rb") as f:
+                cache = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+
+        # Anything that isn't a URL -> entry mapping with cached data is
+        # discarded; a bad cache just means unconditional fetches
+        if not isinstance(cache, dict):
+            return {}
         return {
-            "retailer": retailer,
-            "station_count": (len(stations) if isinstance(stations, list) else 0),
-            "sample_data": (
-                stations[0] if stations and isinstance(stations, list) else data
-            ),
+            url: entry
+            for url, entry in cache.items()
+            if isinstance(entry, dict) and "data" in entry
         }
 
-    def print_summary(self, results: List[Dict]):
+    def save_etag_cache(self):
+        """Persist the conditional request cache for the next run."""
+        try:
+            write_json_atomic(self.etag_cache_file, self.etag_cache)
+        except OSError as e:
+            print(f"Warning: could not save ETag cache: {e}")
+
+    def print_summary(self, results: List[Dict], now: Optional[datetime] = None):
         """
         Print a summary of the fetched prices.
 
         Args:
             results: List of result dictionaries
+            now: Time of the run (default: current time)
         """
-        print(f"\n{'='*80}")
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"Fuel Price Check Summary - {timestamp}")
-        print(f"{'='*80}\n")
+        now = now or datetime.now()
+
+        # Collected and written in one go rather than line by line
+        lines = ["\n" + self.RULE]
+        lines.append(f"Fuel Price Check Summary - {now:%Y-%m-%d %H:%M:%S}")
+        lines.append(self.RULE + "\n")
+
+        # Bucket results by status in a single pass
+        buckets: Dict[str, List[Dict]] = {
+            "success": [],
+            "error": [],
+            "html_format": [],
+        }
+        for result in results:
+            bucket = buckets.get(result["status"])
+            if bucket is not None:
+                bucket.append(result)
 
-        successful = [r for r in results if r["status"] == "success"]
-        errors = [r for r in results if r["status"] == "error"]
-        html_format = [r for r in results if r["status"] == "html_format"]
+        by_retailer = operator.itemgetter("retailer")
+        successful = sorted(buckets["success"], key=by_retailer)
+        errors = sorted(buckets["error"], key=by_retailer)
+        html_format = buckets["html_format"]
 
-        print(f"✓ Successful: {len(successful)}/{len(results)}")
-        print(f"✗ Errors: {len(errors)}/{len(results)}")
-        print(f"⚠ Special Format: {len(html_format)}/{len(results)}")
-        print()
+        lines.append(f"✓ Successful: {len(successful)}/{len(results)}")
+        lines.append(f"✗ Errors: {len(errors)}/{len(results)}")
+        lines.append(f"⚠ Special Format: {len(html_format)}/{len(results)}")
+        lines.append("")
 
         if successful:
-            print(f"\n{'-'*80}")
-            print("SUCCESSFUL FETCHES:")
-            print(f"{'-'*80}")
-            for result in sorted(successful, key=lambda x: x["retailer"]):
-                info = self.extract_station_info(result)
-                if info:
-                    print(f"\n{result['retailer']}:")
-                    print(f"  Stations: {info['station_count']}")
-                    print(f"  URL: {result['url']}")
+            lines.append("\n" + self.DIVIDER)
+            lines.append("SUCCESSFUL FETCHES:")
+            lines.append(self.DIVIDER)
+            for result in successful:
+                lines.append(f"\n{result['retailer']}:")
+                lines.append(f"  Stations: {result['station_count']}")
+                lines.append(f"  URL: {result['url']}")
 
         if html_format:
-            print(f"\n{'-'*80}")
-            print("SPECIAL FORMAT (Needs Manual Handling):")
-            print(f"{'-'*80}")
+            lines.append("\n" + self.DIVIDER)
+            lines.append("SPECIAL FORMAT (Needs Manual Handling):")
+            lines.append(self.DIVIDER)
             for result in html_format:
-                print(f"\n{result['retailer']}:")
-                print(f"  {result['message']}")
-                print(f"  URL: {result['url']}")
+                lines.append(f"\n{result['retailer']}:")
+                lines.append(f"  {result['message']}")
+                lines.append(f"  URL: {result['url']}")
 
         if errors:
-            print(f"\n{'-'*80}")
-            print("ERRORS:")
-            print(f"{'-'*80}")
-            for result in sorted(errors, key=lambda x: x["retailer"]):
-                print(f"\n{result['retailer']}:")
-                print(f"  Error: {result['error']}")
-                print(f"  URL: {result['url']}")
+            lines.append("\n" + self.DIVIDER)
+            lines.append("ERRORS:")
+            lines.append(self.DIVIDER)
+            for result in errors:
+                lines.append(f"\n{result['retailer']}:")
+                lines.append(f"  Error: {result['error']}")
+                lines.append(f"  URL: {result['url']}")
+
+        lines.append("\n" + self.RULE + "\n")
 
-        print(f"\n{'='*80}\n")
+        print("\n".join(lines))
 
     def save_results(
-        self, results: List[Dict], filename: str = "./.data/fuel_prices.json"
+        self,
+        results: List[Dict],
+        filename: str = "./.data/fuel_prices.json",
+        now: Optional[datetime] = None,
     ):
         """
         Save results to a JSON file.
@@ -286,14 +485,15 @@ class FuelPriceChecker:
         Args:
             results: List of result dictionaries
             filename: Output filename
+            now: Time of the run (default: current time)
         """
+        now = now or datetime.now()
         output = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "results": results,
         }
 
-        with open(filename, "w") as f:
-            json.dump(output, f, indent=2)
+        write_json_atomic(filename, output)
 
         print(f"Results saved to {filename}")
 
@@ -302,11 +502,13 @@ def main():
     """Main entry point for the fuel price checker."""
     print("Starting Fuel Price Checker...")
 
-    checker = FuelPriceChecker()
-    results = checker.fetch_all_prices()
+    with FuelPriceChecker() as checker:
+        results = checker.fetch_all_prices()
 
-    checker.print_summary(results)
-    checker.save_results(results)
+        # One timestamp for both the summary and the saved file
+        now = datetime.now()
+        checker.print_summary(results, now)
+        checker.save_results(results, now=now)
 
 
 if __name__ == "__main__":